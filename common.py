@@ -0,0 +1,444 @@
+import asyncio
+import yfinance as yf
+import numpy as np
+import matplotlib
+matplotlib.use('Agg')  # 只輸出 PNG，不載入任何 GUI 後端
+import matplotlib.pyplot as plt
+import requests
+import lxml.html
+import io
+import re
+import os
+import sys
+import json
+import time
+import functools
+from deep_translator import GoogleTranslator
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# ================= 設定區 =================
+WEBHOOK_URL = os.getenv("DISCORD_WEBHOOK_URL")
+
+# 版塊中英對照表
+SECTOR_MAP = {
+    'Information Technology': '資訊科技',
+    'Health Care': '醫療保健',
+    'Financials': '金融',
+    'Consumer Discretionary': '非必需消費',
+    'Communication Services': '通訊服務',
+    'Industrials': '工業',
+    'Consumer Staples': '必需消費',
+    'Energy': '能源',
+    'Utilities': '公用事業',
+    'Real Estate': '房地產',
+    'Materials': '原物料'
+}
+
+if not WEBHOOK_URL:
+    print("錯誤：找不到 DISCORD_WEBHOOK_URL 環境變數！")
+    sys.exit(1)
+
+# yfinance 的簡介固定為英文，指定來源語言以省去自動偵測
+TRANSLATOR = GoogleTranslator(source='en', target='zh-TW')
+SUMMARY_MAX_CHARS = 300  # 簡介截斷長度
+TRANSLATE_MAX_CHARS = 5000  # Google 翻譯單次請求上限
+# 批次翻譯時用來串接各檔簡介的分隔行
+SUMMARY_SEPARATOR = "\n###\n"
+SUMMARY_SEPARATOR_RE = re.compile(r'\s*#{3}\s*')
+
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
+
+# 一年約 252 個點的折線圖，開啟路徑簡化加速繪製
+plt.rcParams.update({
+    'text.usetex': False,
+    'path.simplify': True,
+    'path.simplify_threshold': 1.0,
+    'agg.path.chunksize': 10000,
+})
+
+CHART_DPI = 80  # 降低解析度以縮小上傳 Discord 的圖檔
+
+TOP_N = 10  # 每日報告的個股數
+
+# 抓不到 Wikipedia 名單時的備用清單
+FALLBACK_TICKERS = ['AAPL', 'NVDA', 'MSFT']
+
+# Discord Webhook 每個 bucket 約 5 req/s
+DISCORD_CONCURRENCY = 5
+DISCORD_MAX_ATTEMPTS = 3
+
+# 快取目錄與有效期限 (秒)
+CACHE_DIR = '.cache'
+SP500_LIST_TTL = 30 * 86400  # 成分股每季調整
+INFO_TTL = 7 * 86400         # 公司基本資料變動不頻繁
+
+# info 只快取不隨股價變動的欄位；本益比與股息率一律以當日收盤價計算
+STABLE_INFO_FIELDS = (
+    'symbol',
+    'longBusinessSummary',
+    'trailingEps',
+    'forwardEps',
+    'trailingAnnualDividendRate',
+    'dividendRate',
+)
+# ==========================================
+
+def _make_session():
+    """建立共用連線池的 Session，對 429/5xx 自動重試"""
+    session = requests.Session()
+    session.headers.update({"User-Agent": USER_AGENT})
+    retry = Retry(total=3, backoff_factor=0.3, status_forcelist=[429, 500, 502, 503, 504])
+    adapter = HTTPAdapter(pool_connections=10, pool_maxsize=50, max_retries=retry)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+SESSION = _make_session()
+
+class FileCache:
+    """以 {root}/{endpoint}/{key}.json 儲存 {timestamp, payload} 的檔案快取"""
+
+    def __init__(self, root=CACHE_DIR):
+        self.root = root
+
+    def _path(self, endpoint, key):
+        return os.path.join(self.root, endpoint, f"{key}.json")
+
+    def get(self, endpoint, key, ttl):
+        """讀取未過期的快取內容，不存在或已過期時回傳 None"""
+        try:
+            with open(self._path(endpoint, key), encoding='utf-8') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if time.time() - entry.get('timestamp', 0) < ttl:
+            return entry.get('payload')
+        return None
+
+    def set(self, endpoint, key, payload):
+        path = self._path(endpoint, key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump({'timestamp': time.time(), 'payload': payload}, f, ensure_ascii=False)
+        except (OSError, TypeError, ValueError) as e:
+            print(f"寫入快取失敗 ({endpoint}/{key}): {e}")
+
+FILE_CACHE = FileCache()
+
+def cached(endpoint, ttl, validate=bool):
+    """以 (endpoint, 第一個參數) 為鍵將結果快取至硬碟；未通過 validate 的結果不寫入快取"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args):
+            key = args[0] if args else 'default'
+            payload = FILE_CACHE.get(endpoint, key, ttl)
+            if payload is not None:
+                return payload
+            payload = func(*args)
+            if validate(payload):
+                FILE_CACHE.set(endpoint, key, payload)
+            return payload
+        return wrapper
+    return decorator
+
+@cached('sp500', ttl=SP500_LIST_TTL)
+def get_sp500_tickers_info():
+    """從 Wikipedia 抓取 S&P 500 成分股清單與詳細資訊"""
+    print("正在獲取 S&P 500 成分股名單與詳細資訊...")
+    url = 'https://en.wikipedia.org/wiki/List_of_S%26P_500_companies'
+    try:
+        response = SESSION.get(url)
+        response.raise_for_status()
+        # 只走訪成分股表格，欄位依序為 Symbol / Security / GICS Sector
+        tree = lxml.html.fromstring(response.content)
+        info_dict = {}
+        for row in tree.xpath('//table[@id="constituents"]//tr'):
+            cells = row.xpath('./td')
+            if len(cells) < 3:
+                continue  # 表頭列只有 <th>
+            symbol = cells[0].text_content().strip().replace('.', '-')
+            info_dict[symbol] = {
+                'Security': cells[1].text_content().strip(),
+                'GICS Sector': cells[2].text_content().strip(),
+            }
+        return info_dict
+    except Exception as e:
+        print(f"無法抓取 Wiki 資料: {e}")
+        return {}
+
+def load_sp500_universe():
+    """取得成分股資訊與代碼清單，抓取失敗時改用備用清單"""
+    sp500_info = get_sp500_tickers_info()
+    tickers = list(sp500_info.keys())
+
+    if not tickers:
+        print("警告：使用備用清單")
+        tickers = list(FALLBACK_TICKERS)
+        sp500_info = {t: {'Security': t, 'GICS Sector': 'Unknown'} for t in tickers}
+
+    return sp500_info, tickers
+
+def download_daily_returns(tickers):
+    """下載最後兩個交易日的收盤價並計算漲跌幅，失敗時回傳 None"""
+    print("正在下載股價資料...")
+    # 漲跌幅只需最後兩個交易日；資料不足兩列 (如連假) 時才改抓 5 日
+    data = yf.download(tickers, period="2d", progress=False, threads=True)['Close']
+    if len(data) < 2:
+        data = yf.download(tickers, period="5d", progress=False, threads=True)['Close']
+    data = data.tail(2)
+
+    if data.empty:
+        print("錯誤：無法下載任何股價資料")
+        return None
+
+    returns = data.pct_change().iloc[-1].dropna()
+    if returns.empty:
+        print("錯誤：無法計算任何漲跌幅")
+        return None
+
+    return returns
+
+def select_top_n(returns, largest, n=TOP_N):
+    """以 argpartition 做 O(n) 部分選取，只對選出的前 n 名排序"""
+    vals = returns.to_numpy()
+    if largest:
+        vals = -vals  # 取負值，使漲幅最大者排在最前
+    k = min(n, len(vals))
+    idx = np.argpartition(vals, k - 1)[:k]
+    idx = idx[np.argsort(vals[idx])]
+    return returns.iloc[idx]
+
+def extract_closes(hist, tickers):
+    """將各檔收盤價轉為繪圖用的 (日期, 收盤價) NumPy 陣列，回傳 (closes, last_close)"""
+    dates = hist.index.to_numpy()
+    available = set(hist.columns.get_level_values(0))
+    closes = {}
+    last_close = {}
+    for t in tickers:
+        if t not in available:
+            continue
+        values = hist[(t, 'Close')].to_numpy(dtype=float)
+        mask = ~np.isnan(values)
+        if not mask.any():
+            continue
+        closes[t] = (dates[mask], values[mask])
+        last_close[t] = float(values[mask][-1])
+    return closes, last_close
+
+def _is_complete_info(info):
+    """yfinance 被限流時可能回傳幾乎空白的 info，這類結果不應快取"""
+    return bool(info) and ('symbol' in info or 'longBusinessSummary' in info)
+
+@cached('info', ttl=INFO_TTL, validate=_is_complete_info)
+def fetch_info(ticker):
+    """從 yfinance 取得單一個股 info 中不隨股價變動的欄位"""
+    info = yf.Ticker(ticker).info
+    return {k: info[k] for k in STABLE_INFO_FIELDS if info.get(k) is not None}
+
+async def fetch_all_info(tickers, concurrency=8):
+    """併發抓取多檔個股的 info，回傳 {ticker: info}，失敗者為 None"""
+    sem = asyncio.Semaphore(concurrency)
+
+    async def fetch_one(ticker):
+        async with sem:
+            try:
+                return ticker, await asyncio.to_thread(fetch_info, ticker)
+            except Exception as e:
+                print(f"資料獲取失敗 ({ticker}): {e}")
+                return ticker, None
+
+    results = await asyncio.gather(*(fetch_one(t) for t in tickers))
+    return dict(results)
+
+async def fetch_history_and_info(tickers):
+    """同時下載一年歷史資料與抓取個股 info，兩者互不相依，回傳 (hist, infos)"""
+    # 一次批次下載所有個股的一年歷史資料，取代逐檔下載
+    download = asyncio.to_thread(
+        yf.download, tickers, period="1y", group_by='ticker', threads=True, progress=False, auto_adjust=False
+    )
+    hist, infos = await asyncio.gather(download, fetch_all_info(tickers))
+    return hist, infos
+
+def extract_metadata(ticker, info, close_price):
+    """以當日收盤價計算本益比與精準股息率 (對齊富途 TTM)"""
+    if info is None:
+        return "N/A", "N/A"
+
+    try:
+        # --- 計算本益比：收盤價 / 每股盈餘 (優先用 TTM，其次預估) ---
+        pe_ratio = "N/A"
+        for eps_key in ('trailingEps', 'forwardEps'):
+            eps = info.get(eps_key)
+            if isinstance(eps, (int, float)) and eps > 0 and close_price > 0:
+                pe_ratio = f"{close_price / eps:.2f}"
+                break
+
+        # --- 計算股息率：過去12個月股息 / 當前收盤價 ---
+        div_rate = info.get('trailingAnnualDividendRate')
+        if not isinstance(div_rate, (int, float)):
+            # 備用方案 (若抓不到配息總額，改用年化配息金額)
+            div_rate = info.get('dividendRate')
+
+        if isinstance(div_rate, (int, float)) and close_price > 0:
+            div_yield = (div_rate / close_price) * 100
+            div_yield_str = f"{div_yield:.2f}%" if div_yield > 0 else "0.00%"
+        else:
+            div_yield_str = "N/A"
+
+        return pe_ratio, div_yield_str
+
+    except Exception as e:
+        print(f"資料解析失敗 ({ticker}): {e}")
+        return "N/A", "N/A"
+
+def _translate_each(summaries_en):
+    """逐檔翻譯，單檔失敗只影響該檔，不拖累其他個股"""
+    summaries_zh = {}
+    for ticker, summary_en in summaries_en.items():
+        try:
+            summaries_zh[ticker] = TRANSLATOR.translate(summary_en) + "..."
+        except Exception as e:
+            print(f"翻譯失敗 ({ticker}): {e}")
+            summaries_zh[ticker] = "無法獲取簡介 (翻譯失敗)"
+    return summaries_zh
+
+def _translate_joined(summaries_en):
+    """以分隔行串接所有簡介後只翻譯一次，無法正確切回各檔時回傳 None"""
+    joined = SUMMARY_SEPARATOR.join(summaries_en.values())
+    if len(joined) >= TRANSLATE_MAX_CHARS:
+        return None
+
+    try:
+        parts = SUMMARY_SEPARATOR_RE.split(TRANSLATOR.translate(joined).strip())
+    except Exception as e:
+        print(f"批次翻譯失敗，改為逐檔翻譯: {e}")
+        return None
+
+    if len(parts) != len(summaries_en):
+        print("批次翻譯結果無法對應各檔，改為逐檔翻譯")
+        return None
+
+    return {ticker: part + "..." for ticker, part in zip(summaries_en, parts)}
+
+def get_company_summaries(tickers, infos):
+    """將所有個股簡介合併為一次翻譯請求，回傳 {ticker: 中文簡介}"""
+    summaries = {}
+    summaries_en = {}
+    for ticker in tickers:
+        info = infos.get(ticker)
+        if info is None:
+            summaries[ticker] = "無法獲取簡介"
+            continue
+
+        # 簡介中若本身含有分隔符號會打亂切割，先行移除
+        summary_en = info.get('longBusinessSummary', '').replace('#', '')
+        if not summary_en.strip():
+            summaries[ticker] = "暫無簡介"
+            continue
+
+        summaries_en[ticker] = summary_en[:SUMMARY_MAX_CHARS]
+
+    if summaries_en:
+        summaries.update(_translate_joined(summaries_en) or _translate_each(summaries_en))
+
+    return summaries
+
+def create_chart_figure():
+    """建立所有走勢圖共用的 Figure，避免每張圖重新建立與銷毀"""
+    return plt.subplots(figsize=(10, 5))
+
+def close_chart_figure(fig):
+    plt.close(fig)
+
+def render_chart(fig, ax, buf, ticker, dates, closes, color, title):
+    """在共用的 Figure 上重繪一年走勢圖，寫入並回傳預先配置的 PNG buffer"""
+    ax.clear()
+    ax.plot(dates, closes, color=color, linewidth=1.5)
+    ax.set_title(f"{ticker} - {title}", fontsize=14)
+    ax.grid(True, linestyle='--', alpha=0.5)
+    fig.tight_layout()
+
+    # 訊息最後才併發送出，每個排名使用各自的 buffer
+    buf.seek(0)
+    buf.truncate()
+    fig.savefig(buf, format='png', dpi=CHART_DPI, bbox_inches='tight',
+                pil_kwargs={'optimize': True, 'compress_level': 9})
+    return buf
+
+def post_header(content):
+    """發送報告標題訊息"""
+    SESSION.post(WEBHOOK_URL, json={"content": content})
+
+async def send_to_discord(sem, ticker, message_content, image_buffer):
+    """發送至 Discord (以 Semaphore 限制併發數，遇 429 依 Retry-After 退避重試)"""
+    payload = {"content": message_content}
+
+    async with sem:
+        for attempt in range(DISCORD_MAX_ATTEMPTS):
+            image_buffer.seek(0)
+            files = {"file": (f"{ticker}_1Y.png", image_buffer, "image/png")}
+            response = await asyncio.to_thread(SESSION.post, WEBHOOK_URL, data=payload, files=files)
+            # 最後一次仍遇 429 就直接放棄，不再佔著名額等待
+            if response.status_code != 429 or attempt == DISCORD_MAX_ATTEMPTS - 1:
+                break
+            await asyncio.sleep(float(response.headers.get('Retry-After', 1)))
+
+        # 此 Webhook 的額度已用完時，等待重置後再釋放名額
+        if response.headers.get('X-RateLimit-Remaining') == '0':
+            await asyncio.sleep(float(response.headers.get('X-RateLimit-Reset-After', 1)))
+
+    if response.status_code not in [200, 204]:
+        print(f"發送 {ticker} 失敗，錯誤碼: {response.status_code}")
+
+async def publish_all(items):
+    """併發發送所有 (ticker, 訊息, 圖片) 至 Discord，每則訊息帶有排名以便辨識順序"""
+    sem = asyncio.Semaphore(DISCORD_CONCURRENCY)
+    results = await asyncio.gather(*(send_to_discord(sem, *item) for item in items), return_exceptions=True)
+    for item, result in zip(items, results):
+        if isinstance(result, Exception):
+            print(f"發送 {item[0]} 時發生錯誤: {result}")
+
+def run_report(largest, header, color, title, format_message):
+    """執行完整的每日報告流程：選股、抓資料、繪圖、翻譯並發送至 Discord"""
+    sp500_info, tickers = load_sp500_universe()
+
+    returns = download_daily_returns(tickers)
+    if returns is None:
+        return
+
+    top_n = select_top_n(returns, largest=largest)
+    top_tickers = list(top_n.index)
+
+    # 一年歷史資料與個股 info 同時抓取
+    hist, infos = asyncio.run(fetch_history_and_info(top_tickers))
+    closes, last_close = extract_closes(hist, top_tickers)
+    summaries = get_company_summaries(top_tickers, infos)
+
+    print(f"\n--- {header} ---")
+    post_header(header)
+
+    fig, ax = create_chart_figure()
+    # 前 N 名為固定大小，圖片 buffer 與訊息槽位一次配置好
+    buffers = [io.BytesIO() for _ in range(TOP_N)]
+    items = [None] * TOP_N
+    for rank, (ticker, pct) in enumerate(top_n.items(), start=1):
+        try:
+            if ticker not in last_close: continue
+
+            close_price = last_close[ticker]
+            buf = render_chart(fig, ax, buffers[rank - 1], ticker, *closes[ticker], color, title)
+
+            # --- 將 close_price 傳入以計算精準股息率 ---
+            pe_ratio, div_yield = extract_metadata(ticker, infos.get(ticker), close_price)
+            company_info = sp500_info.get(ticker, {})
+            message = format_message(rank, ticker, company_info, close_price, pct, summaries[ticker], pe_ratio, div_yield)
+
+            items[rank - 1] = (ticker, message, buf)
+
+        except Exception as e:
+            print(f"處理 {ticker} 時發生錯誤: {e}")
+    close_chart_figure(fig)
+
+    asyncio.run(publish_all([item for item in items if item is not None]))